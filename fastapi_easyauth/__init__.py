@@ -2,3 +2,7 @@ from .easyauth import EasyAuth, hash_password, not_authorized
 from .jwt import Jwt, ALGORITHM
 from . import exp
 from . import sessionauth
+from . import sharedstate
+from . import introspection
+from . import clock
+from . import profiling
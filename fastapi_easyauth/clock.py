@@ -0,0 +1,93 @@
+"""
+clock: time sources for checking the lifetime of tokens.
+
+A clock is any callable that returns the current unix time in seconds.
+Jwt uses default_clock, you can pass your own clock, for example ManualClock in tests.
+"""
+
+import os
+import threading
+import time
+from typing import Optional
+
+
+class CachedClock:
+    """Returns the current time cached for resolution seconds. A background daemon thread refreshes it,
+    so reading the time is just an attribute access. The cached time is behind the real time by at most resolution
+    """
+
+    def __init__(self, resolution: float = 1.0):
+        """
+        Args:
+            resolution (float, optional): how often the cached time is refreshed in seconds. Defaults to 1.0.
+        """
+
+        self.resolution = resolution
+        self._now = time.time()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        if hasattr(os, 'register_at_fork'):
+            # threads do not survive fork, the child starts its own ticker
+            os.register_at_fork(after_in_child = self._reset)
+
+    def __call__(self) -> float:
+        if self._thread is None:
+            self.start()
+
+        return self._now
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+
+            self._now = time.time()
+            self._thread = threading.Thread(target = self._tick, name = 'easyauth-clock', daemon = True)
+            self._thread.start()
+
+    def _tick(self):
+        while True:
+            time.sleep(self.resolution)
+            self._now = time.time()
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._thread = None
+
+
+class ManualClock:
+    """A clock that only changes when you change it. Useful in tests to fast-forward the expiry of tokens
+
+    Usage Example:
+
+        clock = ManualClock()
+        jwt = Jwt('secret', clock = clock)
+        token = jwt.create_token(user)
+        clock.advance(exp.EXPIRES_60_MINUTES)
+        jwt.check_lifetime_token(token) # False
+    """
+
+    def __init__(self, now: Optional[float] = None):
+        """
+        Args:
+            now (float, optional): the start time. Defaults to the current time.
+        """
+
+        self.now = time.time() if now is None else now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+    def set(self, now: float):
+        self.now = now
+
+
+def system_clock() -> float:
+    return time.time()
+
+
+default_clock = CachedClock()
@@ -4,6 +4,7 @@ from fastapi import Depends, HTTPException, Request, Response, FastAPI
 from pydantic import BaseModel
 from . import exp
 from .jwt import Jwt
+from .profiling import StageProfiler, stage
 
 
 def not_authorized() -> HTTPException:
@@ -18,17 +19,19 @@ def not_authorized() -> HTTPException:
 
 class EasyAuth:
 
-    def __init__(self, cookie_name: str, jwt: Jwt, expires: int = exp.EXPIRES_30_DAYS):
+    def __init__(self, cookie_name: str, jwt: Jwt, expires: int = exp.EXPIRES_30_DAYS, profiler: Optional[StageProfiler] = None):
         """
         Args:
             cookie_name (str): the name of the cookie of the name in which the user's data will be stored
             jwt (Jwt): Jwt Object will encode and decode user data
             expires (int, optional): cookie lifetime. Defaults to exp.EXPIRES_30_DAYS.
+            profiler (StageProfiler, optional): records the time of every stage of active_user. Defaults to the profiler of the Jwt.
         """
 
         self.cookie_name = cookie_name
         self.jwt = jwt
         self.expires = expires
+        self.profiler = profiler or jwt.profiler
 
     def active_user(self, request: Request, response: Response) -> Union[BaseModel, bool]:
         """
@@ -43,17 +46,21 @@ class EasyAuth:
 
         """
 
-        token = request.cookies.get(self.cookie_name)
-        if not token:
-            return False
+        with self.profiler.request('EasyAuth.active_user'):
+            with stage('cookie'):
+                token = request.cookies.get(self.cookie_name)
 
-        user = self.jwt.decode_token(token, full=False)
+            if not token:
+                return False
 
-        response.set_cookie(
-            key=self.cookie_name,
-            value=token,
-            expires=self.expires
-        )
+            user = self.jwt.decode_token(token, full=False)
+
+            with stage('set_cookie'):
+                response.set_cookie(
+                    key=self.cookie_name,
+                    value=token,
+                    expires=self.expires
+                )
 
         return user
 
@@ -122,6 +129,21 @@ class EasyAuth:
         response.set_cookie(self.cookie_name, token)
         return token
     
+    def revoke_token(self, request: Request, response: Response):
+        """
+        revoke_token: revokes the token from cookies and deletes the cookie. Jwt must be created with a state
+
+        Args:
+            request (Request): FastAPI Request
+            response (Response): FastAPI Response
+        """
+
+        token = request.cookies.get(self.cookie_name)
+        if token:
+            self.jwt.revoke_token(token)
+
+        response.delete_cookie(self.cookie_name)
+
     def check_active_user(self, request: Request, response: Response, error = not_authorized):
         """
         check_active_user: checks if there is an active user, if not, returns an error
@@ -141,7 +163,9 @@ class EasyAuth:
             Union[BaseSchemas, dict]: the model or dict in which the user's data is recorded
         """
         
-        user = self.active_user(request, response)
+        with self.profiler.request('EasyAuth.check_active_user'):
+            user = self.active_user(request, response)
+
         if not user:
             raise HTTPException(status_code = 401, detail = 'Unauthorized')
         
@@ -0,0 +1,165 @@
+import json
+from typing import List, Optional, Sequence
+from urllib.parse import parse_qs
+
+from fastapi import APIRouter, HTTPException, Request
+from jose import jwt as jose_jwt, JWTError
+from starlette.concurrency import run_in_threadpool
+
+from .jwt import Jwt
+from .sharedstate import MemoryStateBackend, StateBackend
+
+
+class Introspection:
+    """RFC 7662 style token introspection on top of Jwt.
+
+    The results are cached. The result of an active token is cached until the token expires (at most max_ttl seconds),
+    so other services can check tokens without the secret and without verifying every token again.
+    Revoked tokens (Jwt with a state) are always checked before the cache.
+    """
+
+    def __init__(self,
+                 jwt: Jwt,
+                 path: str = '/introspect',
+                 cache: Optional[StateBackend] = None,
+                 max_ttl: float = 300,
+                 inactive_ttl: float = 30,
+                 max_tokens: int = 100,
+                 dependencies: Optional[Sequence] = None):
+        """
+        Args:
+            jwt (Jwt): Jwt Object that decodes the tokens
+            path (str, optional): the path of the introspection endpoint. Defaults to '/introspect'.
+            cache (StateBackend, optional): where the results are cached. It can be the state of the Jwt, the keys do not overlap. Defaults to MemoryStateBackend().
+            max_ttl (float, optional): the maximum lifetime of a cached active result in seconds. Defaults to 300.
+            inactive_ttl (float, optional): the lifetime of a cached inactive result in seconds. 0 disables it. Defaults to 30.
+            max_tokens (int, optional): the maximum number of tokens in one request. Defaults to 100.
+            dependencies (Sequence, optional): dependencies of the endpoint, for example the authentication of the calling service. Defaults to None.
+        """
+
+        self.jwt = jwt
+        self.cache = cache if cache is not None else MemoryStateBackend()
+        self.max_ttl = max_ttl
+        self.inactive_ttl = inactive_ttl
+        self.max_tokens = max_tokens
+
+        self.router = APIRouter(dependencies = list(dependencies or []))
+        self.router.add_api_route(path, self.endpoint, methods = ['POST'])
+
+    def introspect(self, token: str) -> dict:
+        """
+        introspect: checks the token and returns the introspection response
+
+        Args:
+            token (str): Jwt token
+
+        Returns:
+            dict: {'active': False} if the token is not valid, otherwise 'active', 'token_type', 'exp', 'iat', 'jti' and 'subject'
+        """
+
+        if self.jwt.state is not None and self.jwt.state.is_revoked(token):
+            return {'active': False}
+
+        key = 'introspect:' + token
+        result = self.cache.get(key)
+        if result is not None:
+            if result['active'] and self.jwt.check_claims(result):
+                return {'active': False}
+
+            return result
+
+        try:
+            payload = self.jwt._decode(token)
+
+        except HTTPException:
+            payload = None
+
+        if not payload:
+            result = {'active': False}
+            self.cache.set(key, result, self._inactive_ttl(token))
+            return result
+
+        result = {
+            'active': True,
+            'token_type': payload.get('type'),
+            'exp': payload.get('exp'),
+            'iat': payload.get('iat'),
+            'nbf': payload.get('nbf'),
+            'jti': payload.get('jti'),
+            'subject': payload.get('subject'),
+        }
+
+        ttl = self.max_ttl
+        if result['exp']:
+            ttl = min(ttl, result['exp'] + self.jwt.leeway - self.jwt.clock())
+
+        self.cache.set(key, result, ttl)
+        return result
+
+    def _inactive_ttl(self, token: str) -> float:
+        # a token that is not valid yet (nbf) becomes active later, do not cache it past that moment.
+        # The claims are not verified here, a forged nbf can only make the cache shorter
+        try:
+            nbf = jose_jwt.get_unverified_claims(token).get('nbf')
+
+        except (JWTError, AttributeError):
+            return self.inactive_ttl
+
+        if not isinstance(nbf, (int, float)) or isinstance(nbf, bool):
+            return self.inactive_ttl
+
+        active_in = nbf - self.jwt.leeway - self.jwt.clock() - getattr(self.jwt.clock, 'resolution', 0)
+        if active_in <= 0:
+            # nbf has passed, the token is inactive for another reason
+            return self.inactive_ttl
+
+        return min(self.inactive_ttl, active_in)
+
+    def introspect_many(self, tokens: List[str]) -> List[dict]:
+        """
+        introspect_many: checks several tokens
+
+        Args:
+            tokens (List[str]): Jwt tokens
+
+        Returns:
+            List[dict]: the introspection responses in the same order as the tokens
+        """
+
+        return [self.introspect(token) for token in tokens]
+
+    async def endpoint(self, request: Request):
+        """
+        The endpoint accepts a form (token=...&token=...) like RFC 7662, or JSON ({"token": "..."} or {"tokens": [...]}).
+        One token returns one introspection response, several tokens or "tokens" return {"results": [...]}
+        """
+
+        body = await request.body()
+        if request.headers.get('content-type', '').startswith('application/json'):
+            try:
+                data = json.loads(body or b'{}')
+
+            except ValueError:
+                raise HTTPException(status_code = 400, detail = 'invalid_request')
+
+            if not isinstance(data, dict):
+                raise HTTPException(status_code = 400, detail = 'invalid_request')
+
+            many = 'tokens' in data
+            tokens = data.get('tokens') if many else [data.get('token')]
+
+        else:
+            tokens = parse_qs(body.decode('latin-1')).get('token', [])
+            many = len(tokens) > 1
+
+        if not isinstance(tokens, list) or not tokens or not all(isinstance(token, str) and token for token in tokens):
+            raise HTTPException(status_code = 400, detail = 'invalid_request')
+
+        if len(tokens) > self.max_tokens:
+            raise HTTPException(status_code = 400, detail = f'No more than {self.max_tokens} tokens in one request')
+
+        results = await run_in_threadpool(self.introspect_many, tokens)
+        if many:
+            return {'results': results}
+
+        return results[0]
@@ -1,8 +1,15 @@
 from datetime import timedelta
+from fastapi import HTTPException
 from fastapi_jwt import JwtAccessBearerCookie
-from typing import Any, Dict, Optional, Union
+from jose import jws, jwt as jose_jwt, JWSError, JWTError
+from typing import Any, Callable, Dict, Optional, Union
 from pydantic import BaseModel
 import hashlib
+import json
+
+from .clock import default_clock
+from .profiling import NULL_PROFILER, StageProfiler, stage
+from .sharedstate import StateBackend
 
 
 class ALGORITHM:
@@ -98,12 +105,24 @@ class Jwt:
                  model: BaseModel = False,
                  auto_error: bool = True,
                  access_expires_delta: timedelta | None = None,
-                 refresh_expires_delta: timedelta | None = None):
+                 refresh_expires_delta: timedelta | None = None,
+                 state: Optional[StateBackend] = None,
+                 leeway: float = 10,
+                 verify_nbf: bool = True,
+                 verify_iat: bool = True,
+                 clock: Optional[Callable[[], float]] = None,
+                 profiler: Optional[StageProfiler] = None):
         """
         Args:
             secret (str): Your secret key, with which you can encode and decode tokens. Keep it a secret
             algorithm (_type_, optional): The encryption algorithm. All algorithms are in the jwt.py in the ALGORITHM class. Defaults to ALGORITHM.HS256.
             model (BaseModel, bool): Model. In the form of this model, the decoded result from the token will be returned. If False, the response will be returned by default
+            state (StateBackend, optional): Stores the verified tokens and the revoked tokens. Use SharedMemoryStateBackend to share them between workers. Defaults to None.
+            leeway (float, optional): how many seconds of clock difference between servers are tolerated when checking exp, nbf and iat. Defaults to 10.
+            verify_nbf (bool, optional): If True, a token is rejected before its nbf (not before) time. Defaults to True.
+            verify_iat (bool, optional): If True, a token issued in the future (iat) is rejected. Defaults to True.
+            clock (Callable[[], float], optional): returns the current unix time. Defaults to clock.default_clock, which is cached for one second.
+            profiler (StageProfiler, optional): records the time of every stage of decoding. EasyAuth and SessionAuth use it too. Defaults to None.
         """
         
 
@@ -116,10 +135,164 @@ class Jwt:
         )
         
         self.model = False
+        self.state = state
+        self.leeway = leeway
+        self.verify_nbf = verify_nbf
+        self.verify_iat = verify_iat
+        self.clock = clock or default_clock
+        self.profiler = profiler or NULL_PROFILER
 
         if type(model) == type(BaseModel):
             self.model = model
 
+    def _decode(self, token: str) -> Optional[dict]:
+        """
+        _decode: decodes the token. If there is a state, the revoked tokens are rejected and the verified tokens are cached until they expire
+
+        Args:
+            token (str): User token
+
+        Returns:
+            Optional[dict]: the payload of the token. None if the token is not valid and auto_error is False
+        """
+
+        if self.state is None:
+            return self._verify(token)
+
+        with stage('state'):
+            revoked, payload = self.state.lookup(token)
+
+        if revoked:
+            return self._error('Token revoked')
+
+        if payload is None:
+            payload = self._verify(token)
+            if payload and payload.get('exp'):
+                self.state.set(token, payload, payload['exp'] + self.leeway - self.clock())
+
+            return payload
+
+        # the clock may have moved since the token was cached
+        error = self.check_claims(payload)
+        if error:
+            return self._error(error)
+
+        return payload
+
+    def _verify(self, token: str) -> Optional[dict]:
+        # the same steps as jose_jwt.decode, split into stages for the profiler.
+        # exp, nbf and iat are checked by check_claims with our clock and leeway
+        try:
+            with stage('signature'):
+                raw = jws.verify(token, self.jwt.secret_key, [self.jwt.algorithm])
+
+        except (JWSError, JWTError) as e:
+            return self._error(f'Wrong token: {e}')
+
+        with stage('json'):
+            try:
+                payload = json.loads(raw.decode('utf-8'))
+
+            except ValueError:
+                payload = None
+
+        if not isinstance(payload, dict):
+            return self._error('Wrong token: Invalid payload string: must be a json object')
+
+        with stage('claims'):
+            error = self._check_registered(payload) or self.check_claims(payload)
+
+        if error:
+            return self._error(error)
+
+        return payload
+
+    @staticmethod
+    def _check_registered(payload: dict) -> Optional[str]:
+        # the checks of jose_jwt.decode without an audience, issuer and subject
+        if 'aud' in payload:
+            return 'Wrong token: Invalid audience'
+
+        if 'sub' in payload and not isinstance(payload['sub'], str):
+            return 'Wrong token: Subject must be a string.'
+
+        if 'jti' in payload and not isinstance(payload['jti'], str):
+            return 'Wrong token: JWT ID must be a string.'
+
+        return None
+
+    def _error(self, detail: str) -> None:
+        if self.jwt.auto_error:
+            raise HTTPException(status_code = 401, detail = detail)
+
+        return None
+
+    def check_claims(self, payload: dict) -> Optional[str]:
+        """
+        check_claims: checks the exp, nbf and iat claims of the decoded token with the clock and the leeway
+
+        Args:
+            payload (dict): the decoded token
+
+        Returns:
+            Optional[str]: the reason why the token is not valid, or None if it is valid
+        """
+
+        now = self.clock()
+        # a cached clock is behind the real time, a token created just now must not look issued in the future
+        ahead = now + getattr(self.clock, 'resolution', 0)
+        exp = payload.get('exp')
+        nbf = payload.get('nbf')
+        iat = payload.get('iat')
+
+        for name, value in (('exp', exp), ('nbf', nbf), ('iat', iat)):
+            if value is not None and (not isinstance(value, (int, float)) or isinstance(value, bool)):
+                return f'Wrong token: {name} must be a number'
+
+        if exp is not None and now > exp + self.leeway:
+            return 'Token time expired: Signature has expired.'
+
+        if self.verify_nbf and nbf is not None and ahead < nbf - self.leeway:
+            return 'Wrong token: The token is not yet valid (nbf)'
+
+        if self.verify_iat and iat is not None and iat > ahead + self.leeway:
+            return 'Wrong token: The token was issued in the future (iat)'
+
+        return None
+
+    def revoke_token(self, token: str, ttl: Optional[float] = None):
+        """
+        revoke_token: adds the token to the denylist of the state. All workers that use the same state will reject it
+
+        Args:
+            token (str): User token
+            ttl (float, optional): how long the token stays in the denylist in seconds. Defaults to the remaining lifetime of the token.
+        """
+
+        if self.state is None:
+            raise ValueError('Jwt was created without a state, tokens cannot be revoked')
+
+        if ttl is None:
+            # only the signature is checked: a token that is not valid yet (nbf, iat) must be revoked too
+            try:
+                payload = jose_jwt.decode(token, self.jwt.secret_key, algorithms = [self.jwt.algorithm],
+                    options = {'verify_exp': False, 'verify_nbf': False, 'verify_iat': False})
+
+            except JWTError:
+                return
+
+            exp = payload.get('exp')
+            if not isinstance(exp, (int, float)) or isinstance(exp, bool):
+                ttl = self.jwt.refresh_expires_delta.total_seconds()
+
+            else:
+                ttl = exp + self.leeway - self.clock()
+                if ttl <= 0:
+                    # the token is already expired
+                    return
+
+        self.state.revoke(token, ttl)
+
     def create_token(self, subject: BaseModel, expires_delta: timedelta = timedelta(hours = 1)) -> str:
         """
         create_token: the function encodes an object of the BaseModel type and creates a token
@@ -132,7 +305,7 @@ class Jwt:
         """
         token = self.jwt.create_access_token(
             subject=subject.dict(),
-            expires_delta=timedelta,
+            expires_delta=expires_delta,
         )
 
         return token
@@ -152,11 +325,14 @@ class Jwt:
             Union[dict, BaseModel]: The answer is returned in the form of a dictionary.
                                     If you specified a model when initializing the class, the response will be returned in this model.
         """
-        result = self.jwt._decode(token)
+        with self.profiler.request('Jwt.decode_token'):
+            result = self._decode(token)
+
+            if self.model:
+                with stage('parse_obj'):
+                    model = self.model.parse_obj(result.get('subject'))
 
-        if self.model:
-            model = self.model.parse_obj(result.get('subject'))
-            return model
+                return model
 
         if full:
             return result
@@ -176,9 +352,12 @@ class Jwt:
             BaseModel: This is your model in which the decoded data is stored
         """
 
-        result = self.jwt._decode(token).get('subject')
+        with self.profiler.request('Jwt.decode_token_in_model'):
+            result = self._decode(token).get('subject')
+
+            with stage('parse_obj'):
+                result_model = model.parse_obj(result)
 
-        result_model = model.parse_obj(result)
         return result_model
 
 
@@ -212,13 +391,13 @@ class Jwt:
     def check_lifetime_token(self, token: str) -> bool:
         if self.jwt.auto_error == True:
             try:
-                data = self.jwt._decode(token)
+                data = self._decode(token)
                 return True
             
             except:
                 return False
         
-        data = self.jwt._decode(token)
+        data = self._decode(token)
         
         return True if data else False
         
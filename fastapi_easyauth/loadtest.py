@@ -0,0 +1,399 @@
+"""
+loadtest: an in-process load-test harness for EasyAuth, SessionAuth and Jwt.
+
+The harness builds a sample FastAPI application, then drives it directly through
+ASGI with many asyncio workers. Every worker is a separate user with its own cookies
+and session, so no external services (server, database, redis) are needed.
+
+Usage Example:
+
+    python -m fastapi_easyauth.loadtest --workers 5000 --duration 30 --threadpool 40
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from http.cookies import SimpleCookie
+from typing import Dict, List, Optional
+
+import anyio.to_thread
+from fastapi import Depends, FastAPI, Request, Response
+from pydantic import BaseModel
+from starlette.middleware.sessions import SessionMiddleware
+
+from . import exp
+from .easyauth import EasyAuth, not_authorized
+from .jwt import Jwt
+from .sessionauth import SessionAuth
+
+
+DEFAULT_MIX = {
+    'login': 1,
+    'refresh': 2,
+    'guarded': 16,
+    'logout': 1,
+}
+
+
+class LoadTestUser(BaseModel):
+    id: int
+    username: str
+
+
+def create_app(jwt: Jwt, auth: EasyAuth, sessionauth: SessionAuth, session_secret: str = 'loadtest') -> FastAPI:
+    """
+    create_app: creates a sample application that uses EasyAuth, SessionAuth and Jwt
+
+    Args:
+        jwt (Jwt): Jwt Object
+        auth (EasyAuth): EasyAuth Object, the token is stored in cookies
+        sessionauth (SessionAuth): SessionAuth Object, the token is stored in the session
+        session_secret (str, optional): the secret key of the SessionMiddleware. Defaults to 'loadtest'.
+
+    Returns:
+        FastAPI: the sample application
+    """
+
+    app = FastAPI()
+    app.add_middleware(SessionMiddleware, secret_key = session_secret)
+
+    @app.post('/login')
+    def login(user: LoadTestUser, request: Request, response: Response):
+        token = auth.create_token(user, response)
+        sessionauth.save_token_in_session(token, request)
+        return {'status': 200}
+
+    @app.post('/refresh')
+    def refresh(request: Request, response: Response):
+        user = auth.active_user(request, response)
+        if not user:
+            not_authorized()
+
+        if not isinstance(user, BaseModel):
+            user = LoadTestUser.parse_obj(user)
+
+        token = jwt.create_token(user)
+        auth.save_token_in_cookie(response, token, expires = auth.expires)
+        sessionauth.save_token_in_session(token, request)
+        return {'status': 200}
+
+    @app.get('/guarded', dependencies = [Depends(auth.check_active_user)])
+    def guarded(request: Request):
+        return {'session': bool(sessionauth.active_user(request))}
+
+    @app.post('/logout')
+    def logout(request: Request, response: Response):
+        response.delete_cookie(auth.cookie_name)
+        sessionauth.delete_token_from_session(request)
+        return {'status': 200}
+
+    return app
+
+
+class _Client:
+    """A minimal ASGI client with its own cookie jar. One client is one simulated user"""
+
+    def __init__(self, app: FastAPI):
+        self.app = app
+        self.cookies: Dict[str, str] = {}
+
+    async def request(self, method: str, path: str, body: Optional[dict] = None) -> int:
+        content = json.dumps(body).encode() if body is not None else b''
+        headers = [(b'host', b'loadtest'), (b'content-length', str(len(content)).encode())]
+        if body is not None:
+            headers.append((b'content-type', b'application/json'))
+
+        if self.cookies:
+            cookie = '; '.join(f'{key}={value}' for key, value in self.cookies.items())
+            headers.append((b'cookie', cookie.encode()))
+
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'root_path': '',
+            'query_string': b'',
+            'headers': headers,
+            'client': ('127.0.0.1', 0),
+            'server': ('loadtest', 80),
+        }
+
+        sent = False
+        status = 0
+
+        async def receive():
+            nonlocal sent
+            if sent:
+                await asyncio.sleep(3600)
+
+            sent = True
+            return {'type': 'http.request', 'body': content, 'more_body': False}
+
+        async def send(message):
+            nonlocal status
+            if message['type'] != 'http.response.start':
+                return
+
+            status = message['status']
+            for key, value in message.get('headers', []):
+                if key.lower() == b'set-cookie':
+                    self._store_cookie(value.decode('latin-1'))
+
+        await self.app(scope, receive, send)
+        return status
+
+    def _store_cookie(self, header: str):
+        cookie = SimpleCookie()
+        cookie.load(header)
+        for key, morsel in cookie.items():
+            if morsel['max-age'] == '0' or not morsel.value:
+                self.cookies.pop(key, None)
+
+            else:
+                self.cookies[key] = morsel.value
+
+
+class LoadTestReport:
+    """The result of a load test run"""
+
+    def __init__(self,
+                 duration: float,
+                 latencies: Dict[str, List[float]],
+                 errors: Dict[str, int],
+                 loop_lag: List[float],
+                 threadpool_size: int = 0,
+                 threads_busy: Optional[List[int]] = None,
+                 threads_waiting: Optional[List[int]] = None):
+        """
+        Args:
+            duration (float): the real duration of the run in seconds
+            latencies (Dict[str, List[float]]): latencies in seconds of each operation
+            errors (Dict[str, int]): the number of unexpected responses of each operation
+            loop_lag (List[float]): event loop lag samples in seconds
+            threadpool_size (int, optional): the number of threads for the sync dependencies. Defaults to 0.
+            threads_busy (List[int], optional): samples of the number of busy threads. Defaults to None.
+            threads_waiting (List[int], optional): samples of the number of calls waiting for a free thread. Defaults to None.
+        """
+
+        self.duration = duration
+        self.latencies = latencies
+        self.errors = errors
+        self.loop_lag = loop_lag
+        self.threadpool_size = threadpool_size
+        self.threads_busy = threads_busy or []
+        self.threads_waiting = threads_waiting or []
+
+    @staticmethod
+    def percentile(values: List[float], percent: float) -> float:
+        if not values:
+            return 0.0
+
+        values = sorted(values)
+        index = min(len(values) - 1, max(0, round(percent / 100 * len(values)) - 1))
+        return values[index]
+
+    @property
+    def requests(self) -> int:
+        return sum(len(values) for values in self.latencies.values())
+
+    @property
+    def throughput(self) -> float:
+        return self.requests / self.duration if self.duration else 0.0
+
+    def as_dict(self) -> dict:
+        """
+        as_dict: returns the report as a dictionary. All times are in milliseconds
+
+        Returns:
+            dict: throughput, p50/p99 latency of every operation, event loop lag and threadpool usage.
+                  threads_waiting above 0 means the threadpool is saturated
+        """
+
+        all_latencies = [value for values in self.latencies.values() for value in values]
+        operations = {
+            name: {
+                'requests': len(values),
+                'errors': self.errors.get(name, 0),
+                'p50_ms': self.percentile(values, 50) * 1000,
+                'p99_ms': self.percentile(values, 99) * 1000,
+            }
+            for name, values in self.latencies.items()
+        }
+
+        return {
+            'duration_s': self.duration,
+            'requests': self.requests,
+            'throughput_rps': self.throughput,
+            'p50_ms': self.percentile(all_latencies, 50) * 1000,
+            'p99_ms': self.percentile(all_latencies, 99) * 1000,
+            'loop_lag_p50_ms': self.percentile(self.loop_lag, 50) * 1000,
+            'loop_lag_p99_ms': self.percentile(self.loop_lag, 99) * 1000,
+            'loop_lag_max_ms': max(self.loop_lag, default = 0.0) * 1000,
+            'threadpool_size': self.threadpool_size,
+            'threads_busy_p99': self.percentile(self.threads_busy, 99),
+            'threads_busy_max': max(self.threads_busy, default = 0),
+            'threads_waiting_p99': self.percentile(self.threads_waiting, 99),
+            'threads_waiting_max': max(self.threads_waiting, default = 0),
+            'operations': operations,
+        }
+
+    def __str__(self) -> str:
+        report = self.as_dict()
+        lines = [
+            f"requests: {report['requests']} in {report['duration_s']:.2f}s ({report['throughput_rps']:.1f} req/s)",
+            f"latency: p50 {report['p50_ms']:.2f}ms, p99 {report['p99_ms']:.2f}ms",
+            f"event loop lag: p50 {report['loop_lag_p50_ms']:.2f}ms, p99 {report['loop_lag_p99_ms']:.2f}ms, max {report['loop_lag_max_ms']:.2f}ms",
+            f"threadpool: {report['threadpool_size']} threads, busy p99 {report['threads_busy_p99']:.0f} max {report['threads_busy_max']}, "
+            f"waiting p99 {report['threads_waiting_p99']:.0f} max {report['threads_waiting_max']}",
+        ]
+
+        for name, operation in report['operations'].items():
+            lines.append(
+                f"  {name:<8} {operation['requests']:>8} req  {operation['errors']:>6} err  "
+                f"p50 {operation['p50_ms']:.2f}ms  p99 {operation['p99_ms']:.2f}ms"
+            )
+
+        return '\n'.join(lines)
+
+
+async def _monitor(loop_lag: List[float], threads_busy: List[int], threads_waiting: List[int], interval: float, stop: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        loop_lag.append(max(0.0, loop.time() - started - interval))
+        threads_busy.append(limiter.borrowed_tokens)
+        threads_waiting.append(limiter.statistics().tasks_waiting)
+
+
+async def run(
+    workers: int = 100,
+    duration: float = 10.0,
+    mix: Optional[Dict[str, float]] = None,
+    threadpool: Optional[int] = None,
+    app: Optional[FastAPI] = None,
+    lag_interval: float = 0.01,
+) -> LoadTestReport:
+    """
+    run: drives the sample application with concurrent workers and measures it
+
+    Args:
+        workers (int, optional): the number of concurrent asyncio workers (simulated users). Defaults to 100.
+        duration (float, optional): how long the load lasts in seconds. Defaults to 10.0.
+        mix (Dict[str, float], optional): the weights of the operations login, refresh, guarded and logout for a logged in worker.
+            A login re-logs in the worker. After a logout the worker always logs in again. Defaults to DEFAULT_MIX.
+        threadpool (int, optional): the number of threads for the sync dependencies. Defaults to the anyio default (40).
+        app (FastAPI, optional): the application under test. It must have the same routes as create_app. Defaults to create_app().
+        lag_interval (float, optional): how often the event loop lag and the threadpool are sampled in seconds. Defaults to 0.01.
+
+    Returns:
+        LoadTestReport: throughput, latency, event loop lag and threadpool usage
+    """
+
+    if app is None:
+        jwt = Jwt('loadtest-secret', model = LoadTestUser)
+        app = create_app(
+            jwt = jwt,
+            auth = EasyAuth(cookie_name = 'user', jwt = jwt, expires = exp.EXPIRES_1_DAY),
+            sessionauth = SessionAuth(jwt = jwt, name_in_session = 'session-auth'),
+        )
+
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    original_threadpool = limiter.total_tokens
+    if threadpool:
+        limiter.total_tokens = threadpool
+
+    mix = mix or DEFAULT_MIX
+    names = [name for name in DEFAULT_MIX if mix.get(name)]
+    weights = [mix[name] for name in names]
+
+    latencies: Dict[str, List[float]] = {name: [] for name in DEFAULT_MIX}
+    errors: Dict[str, int] = {name: 0 for name in DEFAULT_MIX}
+    loop_lag: List[float] = []
+    threads_busy: List[int] = []
+    threads_waiting: List[int] = []
+    stop = asyncio.Event()
+
+    async def call(client: _Client, name: str, method: str, path: str, body: Optional[dict] = None) -> int:
+        started = time.perf_counter()
+        status = await client.request(method, path, body)
+        latencies[name].append(time.perf_counter() - started)
+        if status != 200:
+            errors[name] += 1
+
+        return status
+
+    async def worker(number: int):
+        client = _Client(app)
+        user = {'id': number, 'username': f'user{number}'}
+        logged_in = False
+        while not stop.is_set():
+            name = random.choices(names, weights)[0] if names else 'guarded'
+            if not logged_in or name == 'login':
+                logged_in = await call(client, 'login', 'POST', '/login', user) == 200
+
+            elif name == 'refresh':
+                await call(client, name, 'POST', '/refresh')
+
+            elif name == 'guarded':
+                await call(client, name, 'GET', '/guarded')
+
+            else:
+                await call(client, name, 'POST', '/logout')
+                logged_in = False
+
+    started = time.perf_counter()
+    monitor = asyncio.create_task(_monitor(loop_lag, threads_busy, threads_waiting, lag_interval, stop))
+    tasks = [asyncio.create_task(worker(number)) for number in range(workers)]
+
+    try:
+        await asyncio.sleep(duration)
+        stop.set()
+        await asyncio.gather(*tasks, monitor)
+
+    finally:
+        stop.set()
+        threadpool_size = limiter.total_tokens
+        limiter.total_tokens = original_threadpool
+
+    return LoadTestReport(
+        duration = time.perf_counter() - started,
+        latencies = latencies,
+        errors = errors,
+        loop_lag = loop_lag,
+        threadpool_size = threadpool_size,
+        threads_busy = threads_busy,
+        threads_waiting = threads_waiting,
+    )
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description = 'In-process load test of fastapi-easyauth')
+    parser.add_argument('--workers', type = int, default = 100, help = 'concurrent asyncio workers (simulated users)')
+    parser.add_argument('--duration', type = float, default = 10.0, help = 'duration of the load in seconds')
+    parser.add_argument('--threadpool', type = int, default = None, help = 'threads for the sync dependencies')
+    for name, weight in DEFAULT_MIX.items():
+        parser.add_argument(f'--{name}', type = float, default = weight, help = f'weight of the {name} operation')
+
+    parser.add_argument('--json', action = 'store_true', help = 'print the report as JSON')
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(
+        workers = args.workers,
+        duration = args.duration,
+        mix = {name: getattr(args, name) for name in DEFAULT_MIX},
+        threadpool = args.threadpool,
+    ))
+
+    print(json.dumps(report.as_dict(), indent = 2) if args.json else report)
+
+
+if __name__ == '__main__':
+    main()
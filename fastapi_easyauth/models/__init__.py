@@ -1,2 +1,3 @@
 from .base import BaseValidateConfig, UserBaseModel
-from .usermodels import UserModelR, FullUserModel
\ No newline at end of file
+from .usermodels import UserModelR, FullUserModel
+from .transfer import export_users, import_users
\ No newline at end of file
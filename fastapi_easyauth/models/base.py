@@ -16,13 +16,13 @@ class UserBaseModel:
     email: Mapped[str] = mapped_column(nullable = True, unique = True)
     
     
-    def validate(self) -> tuple[bool, str]: 
+    def validate(self, check_deliverability: bool = True) -> tuple[bool, str]: 
         if self.ValidateConfig.min_lenght_username > len(self.username) or len(self.username) > self.ValidateConfig.max_lenght_username:
             return (False, f'The user name must be between {self.ValidateConfig.min_lenght_username} and {self.ValidateConfig.max_lenght_username} characters long')
             
         if self.email:      
             try:
-                validate_email(self.email)
+                validate_email(self.email, check_deliverability = check_deliverability)
                 
             except EmailSyntaxError as e:
                 return (False, f'The mail syntax is incorrect')
@@ -0,0 +1,209 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+
+FORMATS = ('ndjson', 'csv')
+
+
+def _check_format(format: str):
+    if format not in FORMATS:
+        raise ValueError(f'Unknown format {format!r}, use one of {FORMATS}')
+
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+
+    return value
+
+
+def _python_types(model) -> Dict[str, Tuple[type, bool]]:
+    types = {}
+    for column in model.__table__.columns:
+        try:
+            types[column.name] = (column.type.python_type, column.nullable)
+
+        except NotImplementedError:
+            types[column.name] = (object, column.nullable)
+
+    return types
+
+
+def _from_text(value: Any, python_type: type, nullable: bool, empty_is_null: bool) -> Any:
+    if not isinstance(value, str):
+        return value
+
+    # csv writes None as an empty string
+    if value == '' and (empty_is_null and nullable or python_type not in (str, object)):
+        return None
+
+    if python_type in (str, object):
+        return value
+
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+
+    if python_type is date:
+        return date.fromisoformat(value)
+
+    if python_type is bool:
+        return value.lower() in ('1', 'true', 'yes')
+
+    return python_type(value)
+
+
+def export_users(
+    session: Session,
+    model,
+    format: str = 'ndjson',
+    batch_size: int = 1000,
+    exclude: Iterable[str] = (),
+) -> Iterator[str]:
+    """
+    export_users: streams the user table line by line. The rows are read with a server-side cursor,
+    so the memory does not depend on the number of users
+
+    Args:
+        session (Session): SQLAlchemy Session
+        model: your mapped user class (based on UserBaseModel, FullUserModel or UserModelR)
+        format (str, optional): 'ndjson' (one JSON object per line) or 'csv'. Defaults to 'ndjson'.
+        batch_size (int, optional): how many rows are fetched from the database at a time. Defaults to 1000.
+        exclude (Iterable[str], optional): the columns that are not exported. Defaults to ().
+
+    Usage Example:
+
+        with open('users.ndjson', 'w') as f:
+            f.writelines(export_users(session, User))
+
+        # csv files must be opened with newline=''
+        with open('users.csv', 'w', newline = '') as f:
+            f.writelines(export_users(session, User, format = 'csv'))
+
+    Returns:
+        Iterator[str]: lines ending with a newline
+    """
+
+    _check_format(format)
+    columns = [column for column in model.__table__.columns if column.name not in set(exclude)]
+    names = [column.name for column in columns]
+
+    result = session.execute(
+        select(*columns)
+        .order_by(*model.__table__.primary_key.columns)
+        .execution_options(stream_results = True, yield_per = batch_size)
+    )
+
+    if format == 'ndjson':
+        for row in result:
+            yield json.dumps({name: _to_json(value) for name, value in zip(names, row)}) + '\n'
+
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator = '\n')
+    writer.writerow(names)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    for row in result:
+        writer.writerow([_to_json(value) for value in row])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def import_users(
+    session: Session,
+    model,
+    lines: Iterable[str],
+    format: str = 'ndjson',
+    batch_size: int = 1000,
+    validate: bool = True,
+    skip_invalid: bool = False,
+    check_deliverability: bool = False,
+) -> Tuple[int, int]:
+    """
+    import_users: reads users line by line and inserts them in batches with executemany.
+    Every user is checked with the ValidateConfig rules of the model before it is inserted.
+    The transaction is not committed, call session.commit() after the import
+
+    Args:
+        session (Session): SQLAlchemy Session
+        model: your mapped user class (based on UserBaseModel, FullUserModel or UserModelR)
+        lines (Iterable[str]): the lines created by export_users, for example an open file
+        format (str, optional): 'ndjson' or 'csv'. Defaults to 'ndjson'.
+        batch_size (int, optional): how many users are inserted at a time. Defaults to 1000.
+        validate (bool, optional): If True, the model's validate() is called for every user. Defaults to True.
+        skip_invalid (bool, optional): If True, invalid users are skipped, otherwise ValueError is raised. Defaults to False.
+        check_deliverability (bool, optional): If True, the domain of every email is checked with a DNS query.
+            It is off by default, because a network call per user is too slow for large imports and fails on hosts without DNS. Defaults to False.
+
+    Usage Example:
+
+        with open('users.ndjson') as f:
+            imported, skipped = import_users(session, User, f)
+
+        session.commit()
+
+    Returns:
+        Tuple[int, int]: the number of imported and skipped users
+    """
+
+    _check_format(format)
+    types = _python_types(model)
+    table = model.__table__
+
+    if format == 'ndjson':
+        rows = (json.loads(line) for line in lines if line.strip())
+
+    else:
+        rows = csv.DictReader(lines)
+
+    imported = 0
+    skipped = 0
+    batch: List[Dict[str, Any]] = []
+    keys: Optional[frozenset] = None
+
+    def flush():
+        nonlocal imported
+        if batch:
+            session.execute(insert(table), batch)
+            imported += len(batch)
+            batch.clear()
+
+    for number, row in enumerate(rows, start = 1):
+        data = {
+            key: _from_text(value, *types[key], empty_is_null = format == 'csv')
+            for key, value in row.items() if key in types
+        }
+
+        if validate:
+            try:
+                valid, message = model(**data).validate(check_deliverability = check_deliverability)
+
+            except (TypeError, ValueError) as e:
+                valid, message = False, str(e)
+
+            if not valid:
+                if skip_invalid:
+                    skipped += 1
+                    continue
+
+                raise ValueError(f'User {number}: {message}')
+
+        # executemany needs the same columns in every row of the batch
+        if keys != frozenset(data) or len(batch) >= batch_size:
+            flush()
+            keys = frozenset(data)
+
+        batch.append(data)
+
+    flush()
+    return imported, skipped
@@ -18,9 +18,10 @@ class FullUserModel(UserBaseModel):
     
     def validate(
         self,
+        check_deliverability: bool = True,
     ) -> tuple[bool, str]:
         
-        result = super().validate()
+        result = super().validate(check_deliverability)
         if result[0] == False:
             return result
         
@@ -0,0 +1,206 @@
+"""
+profiling: an opt-in profiler that measures how long each stage of authentication takes.
+
+Stages recorded by the library:
+    cookie, session     - reading the token from the cookie or the session (EasyAuth, SessionAuth)
+    state               - the cache and denylist lookup (Jwt with a state)
+    signature           - verifying the signature of the token (Jwt)
+    json                - decoding the JSON payload (Jwt)
+    claims              - checking exp, nbf, iat and the other registered claims (Jwt)
+    parse_obj           - converting the payload into the model (Jwt)
+    set_cookie          - the cookie sent back by EasyAuth.active_user
+
+Usage Example:
+
+    profiler = StageProfiler(sample_rate = 0.01)
+    jwt = Jwt('secret', profiler = profiler)
+    auth = EasyAuth('user', jwt) # EasyAuth and SessionAuth use the profiler of the Jwt
+    app.include_router(profiler.router(dependencies = [Depends(only_admins)]))
+
+The stages are recorded into the request that is being profiled, whichever object started it,
+so a profiler passed only to EasyAuth or SessionAuth still gets the stages of the Jwt.
+"""
+
+import random
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence
+
+from fastapi import APIRouter
+
+
+class _Trace:
+    __slots__ = ('name', 'started', 'stages')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def add(self, stage: str, duration: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + duration
+
+
+# a request that was not sampled, nested calls must not start their own trace
+_SKIP = _Trace('skip')
+_current: ContextVar[Optional[_Trace]] = ContextVar('easyauth_trace', default = None)
+
+
+class StageProfiler:
+    """Records the time of every stage of sampled requests into a fixed-size ring buffer"""
+
+    def __init__(self, size: int = 1000, sample_rate: float = 1.0):
+        """
+        Args:
+            size (int, optional): how many of the last sampled requests are kept. Defaults to 1000.
+            sample_rate (float, optional): the share of requests that are profiled, from 0 to 1. Defaults to 1.0.
+        """
+
+        self.sample_rate = sample_rate
+        self.records = deque(maxlen = size)
+
+    @contextmanager
+    def request(self, name: str):
+        """Profiles one call of an authentication method. Nested calls are added to the outer request"""
+
+        if _current.get() is not None:
+            yield
+            return
+
+        trace = _Trace(name) if random.random() < self.sample_rate else _SKIP
+        reset = _current.set(trace)
+        try:
+            yield
+
+        finally:
+            _current.reset(reset)
+            if trace is not _SKIP:
+                self.records.append((trace.name, time.perf_counter() - trace.started, trace.stages))
+
+    def stage(self, name: str):
+        """Measures one stage of the current request. The same as the stage function"""
+
+        return stage(name)
+
+    def reset(self):
+        self.records.clear()
+
+    def dump(self, slowest: int = 10) -> dict:
+        """
+        dump: aggregates the recorded requests. All times are in milliseconds
+
+        Args:
+            slowest (int, optional): how many of the slowest requests are returned. Defaults to 10.
+
+        Returns:
+            dict: 'requests' (count, p50, p99, max of the whole call per method), 'stages' (count, total, mean, p50, p99, max per stage)
+                  and 'slowest' (the slowest requests with their stages)
+        """
+
+        records = list(self.records)
+        totals: Dict[str, List[float]] = {}
+        stages: Dict[str, List[float]] = {}
+        for name, total, trace_stages in records:
+            totals.setdefault(name, []).append(total)
+            for stage, duration in trace_stages.items():
+                stages.setdefault(stage, []).append(duration)
+
+        return {
+            'sample_rate': self.sample_rate,
+            'recorded': len(records),
+            'requests': {name: _summary(values) for name, values in totals.items()},
+            'stages': {name: _summary(values) for name, values in stages.items()},
+            'slowest': [
+                {
+                    'name': name,
+                    'total_ms': total * 1000,
+                    'stages_ms': {stage: duration * 1000 for stage, duration in trace_stages.items()},
+                }
+                for name, total, trace_stages in sorted(records, key = lambda record: record[1], reverse = True)[:slowest]
+            ],
+        }
+
+    def router(self, path: str = '/debug/easyauth/profile', dependencies: Optional[Sequence] = None):
+        """
+        router: creates an APIRouter with a GET endpoint that returns dump(). Protect it with dependencies
+
+        Args:
+            path (str, optional): the path of the endpoint. Defaults to '/debug/easyauth/profile'.
+            dependencies (Sequence, optional): dependencies of the endpoint. Defaults to None.
+
+        Returns:
+            APIRouter: FastAPI APIRouter
+        """
+
+        router = APIRouter(dependencies = list(dependencies or []))
+
+        @router.get(path)
+        def profile(slowest: int = 10):
+            return self.dump(slowest)
+
+        return router
+
+
+class _NullProfiler:
+    """Used when profiling is off. Does nothing"""
+
+    sample_rate = 0.0
+    _context = nullcontext()
+
+    def request(self, name: str):
+        return self._context
+
+
+NULL_PROFILER = _NullProfiler()
+_NULL_CONTEXT = nullcontext()
+
+
+class _Stage:
+    __slots__ = ('trace', 'name', 'started')
+
+    def __init__(self, trace: _Trace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *args):
+        self.trace.add(self.name, time.perf_counter() - self.started)
+
+
+def stage(name: str):
+    """
+    stage: measures one stage of the request that is being profiled now, by any profiler.
+    If no request is being profiled, it does nothing
+
+    Args:
+        name (str): the name of the stage
+
+    Usage Example:
+
+        with stage('signature'):
+            raw = jws.verify(token, key, algorithms)
+    """
+
+    trace = _current.get()
+    if trace is None or trace is _SKIP:
+        return _NULL_CONTEXT
+
+    return _Stage(trace, name)
+
+
+def _summary(values: List[float]) -> dict:
+    values = sorted(values)
+    count = len(values)
+    total = sum(values)
+    return {
+        'count': count,
+        'total_ms': total * 1000,
+        'mean_ms': total / count * 1000,
+        'p50_ms': values[min(count - 1, count // 2)] * 1000,
+        'p99_ms': values[min(count - 1, int(count * 0.99))] * 1000,
+        'max_ms': values[-1] * 1000,
+    }
@@ -2,23 +2,26 @@ from fastapi import Request
 from fastapi.responses import JSONResponse, RedirectResponse
 from pydantic import BaseModel
 from . import jwt
+from .profiling import StageProfiler, stage
 from functools import wraps
 
-from typing import Union
+from typing import Optional, Union
 
 class SessionAuth:
     
-    def __init__(self, jwt: jwt.Jwt, name_in_session: str):
+    def __init__(self, jwt: jwt.Jwt, name_in_session: str, profiler: Optional[StageProfiler] = None):
         """The Session Auth class is used to store the tokens in the session.
         This class helps the robot with creating tokens, storing tokens in a session, and verifying an active user.
 
         Args:
             jwt (jwt.Jwt)
             name_in_session (str): The jwt token will be stored in the session under this name
+            profiler (StageProfiler, optional): records the time of every stage of active_user. Defaults to the profiler of the Jwt.
         """
         
         self.jwt = jwt
         self.name = name_in_session
+        self.profiler = profiler or jwt.profiler
 
 
     def create_token(self, subject: BaseModel):
@@ -53,23 +56,31 @@ class SessionAuth:
             Union[False, Union[dict, BaseModel]]: If there is no token in the session, then False, otherwise either the dictionary or the model
         """
         
-        user = request.session.get(self.name)
-        if user:
-            try:    
-                return self.jwt.decode_token(user, full = False)
+        with self.profiler.request('SessionAuth.active_user'):
+            with stage('session'):
+                user = request.session.get(self.name)
+
+            if user:
+                try:    
+                    return self.jwt.decode_token(user, full = False)
+                
+                except:
+                    return False
             
-            except:
-                return False
-        
-        else: return False
+            else: return False
     
     
-    def delete_token_from_session(self, request: Request):
+    def delete_token_from_session(self, request: Request, revoke: bool = False):
         """Removes the token from the session
 
         Args:
             request (Request): FastAPI Request
+            revoke (bool, optional): If True, the token is also revoked, so it is rejected by all workers. Jwt must be created with a state. Defaults to False.
         """
+        token = request.session.get(self.name)
+        if revoke and token:
+            self.jwt.revoke_token(token)
+
         request.session[self.name] = None
         
     
@@ -0,0 +1,386 @@
+"""
+sharedstate: backends that store the verified-token cache and the revoked tokens (denylist).
+
+MemoryStateBackend keeps the state in the current process.
+SharedMemoryStateBackend keeps it in a memory-mapped file, so all the workers on one node
+(uvicorn --workers, gunicorn) share one cache and one denylist without Redis.
+
+Usage Example:
+
+    state = SharedMemoryStateBackend('/dev/shm/fastapi-easyauth')
+    jwt = Jwt('secret', state = state)
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+try:
+    import fcntl
+
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+def token_key(token: str) -> bytes:
+    """
+    token_key: returns a short fixed-size key of the token. The token itself is never stored
+
+    Args:
+        token (str): Jwt token
+
+    Returns:
+        bytes: 16 bytes key
+    """
+
+    return hashlib.blake2b(token.encode(), digest_size = 16).digest()
+
+
+class SharedStateFull(Exception):
+    """There is no free slot for the revoked token. Increase the number of slots"""
+
+
+class StateBackend(ABC):
+    """The interface of the verified-token cache and the denylist"""
+
+    @abstractmethod
+    def get(self, token: str) -> Optional[dict]:
+        """Returns a copy of the cached payload of the token, or None"""
+
+    @abstractmethod
+    def set(self, token: str, payload: dict, ttl: float):
+        """Caches the payload of the verified token for ttl seconds"""
+
+    @abstractmethod
+    def delete(self, token: str):
+        """Removes the token from the cache"""
+
+    @abstractmethod
+    def revoke(self, token: str, ttl: float):
+        """Adds the token to the denylist for ttl seconds and removes it from the cache"""
+
+    @abstractmethod
+    def is_revoked(self, token: str) -> bool:
+        """Returns True if the token is in the denylist"""
+
+    @abstractmethod
+    def clear(self):
+        """Removes all the cached and revoked tokens"""
+
+    def lookup(self, token: str) -> Tuple[bool, Optional[dict]]:
+        """Returns whether the token is revoked and, if it is not, a copy of its cached payload or None.
+        Backends override it to do both checks at once"""
+
+        if self.is_revoked(token):
+            return True, None
+
+        return False, self.get(token)
+
+
+class MemoryStateBackend(StateBackend):
+    """The state is stored in the memory of the current process"""
+
+    def __init__(self, max_items: int = 100_000):
+        """
+        Args:
+            max_items (int, optional): the maximum number of cached tokens. Defaults to 100_000.
+        """
+
+        self.max_items = max_items
+        # payloads are stored as JSON, so every get returns a new object
+        self._cache: Dict[bytes, Tuple[float, str]] = {}
+        self._revoked: Dict[bytes, float] = {}
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[dict]:
+        key = token_key(token)
+        item = self._cache.get(key)
+        if item is None:
+            return None
+
+        if item[0] <= time.time():
+            self._cache.pop(key, None)
+            return None
+
+        return json.loads(item[1])
+
+    def set(self, token: str, payload: dict, ttl: float):
+        if ttl <= 0:
+            return
+
+        value = json.dumps(payload, separators = (',', ':'))
+        with self._lock:
+            if len(self._cache) >= self.max_items:
+                self._cache.pop(next(iter(self._cache)), None)
+
+            self._cache[token_key(token)] = (time.time() + ttl, value)
+
+    def delete(self, token: str):
+        self._cache.pop(token_key(token), None)
+
+    def revoke(self, token: str, ttl: float):
+        key = token_key(token)
+        with self._lock:
+            self._revoked[key] = time.time() + ttl
+            self._cache.pop(key, None)
+
+    def is_revoked(self, token: str) -> bool:
+        key = token_key(token)
+        expires = self._revoked.get(key)
+        if expires is None:
+            return False
+
+        if expires <= time.time():
+            self._revoked.pop(key, None)
+            return False
+
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._revoked.clear()
+
+
+class SharedMemoryStateBackend(StateBackend):
+    """The state is stored in a memory-mapped file and is shared by all the processes that open the same path.
+
+    The file is a fixed-size hash table with linear probing. Writes take an exclusive flock and reads a shared one,
+    so workers only wait for each other while a token is being cached or revoked. A waiting write blocks new reads,
+    so a busy worker cannot delay a revocation for long. A revocation made by one worker
+    is visible to all the other workers on their next check, without any extra delay.
+    Only Unix is supported. Put the file on tmpfs (/dev/shm) so that it never touches the disk.
+    """
+
+    _MAGIC = b'EASYAUTH'
+    _HEADER = struct.Struct('<8sIII')
+    _HEADER_SIZE = 64
+    _SLOT = struct.Struct('<16sdBI')
+
+    _EMPTY = 0
+    _CACHED = 1
+    _REVOKED = 2
+    _DELETED = 3
+
+    # after this many reads the shared flock is released, so writers of the other processes get it
+    _MAX_READERS = 64
+
+    def __init__(self, path: str = '/dev/shm/fastapi-easyauth', slots: int = 65_536, slot_size: int = 1024, max_probes: int = 32):
+        """
+        Args:
+            path (str, optional): the file shared by the workers. Defaults to '/dev/shm/fastapi-easyauth'.
+            slots (int, optional): the number of tokens that can be stored. Defaults to 65_536.
+            slot_size (int, optional): the size of one slot in bytes. Payloads that do not fit are not cached. Defaults to 1024.
+            max_probes (int, optional): how many neighbouring slots are checked for one token. Defaults to 32.
+        """
+
+        if fcntl is None:
+            raise RuntimeError('SharedMemoryStateBackend is only supported on Unix')
+
+        if slot_size <= self._SLOT.size:
+            raise ValueError(f'slot_size must be greater than {self._SLOT.size}')
+
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+        self.max_probes = min(max_probes, slots)
+
+        # flock belongs to the open file, not to the thread, so threads of one process share it:
+        # the first reader takes the shared flock for all readers and the last one releases it.
+        # A waiting writer blocks new readers, otherwise overlapping readers would never let it in
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._batch = 0
+        self._writing = False
+        self._writers_waiting = 0
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = self._HEADER_SIZE + slots * slot_size
+
+        with self._locked():
+            if os.fstat(self._fd).st_size == 0:
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, self._HEADER.pack(self._MAGIC, 1, slots, slot_size), 0)
+
+            magic, _, file_slots, file_slot_size = self._HEADER.unpack(os.pread(self._fd, self._HEADER.size, 0))
+            if magic != self._MAGIC or (file_slots, file_slot_size) != (slots, slot_size):
+                os.close(self._fd)
+                raise ValueError(f'{path} was created with other settings or is not a state file')
+
+        self._map = mmap.mmap(self._fd, size)
+
+    @contextmanager
+    def _locked(self):
+        with self._condition:
+            self._writers_waiting += 1
+            try:
+                self._condition.wait_for(lambda: not self._writing and self._readers == 0)
+
+            finally:
+                self._writers_waiting -= 1
+                self._condition.notify_all()
+
+            self._writing = True
+
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+    @contextmanager
+    def _shared(self):
+        with self._condition:
+            self._condition.wait_for(
+                lambda: not self._writing and self._writers_waiting == 0 and self._batch < self._MAX_READERS
+            )
+            if self._readers == 0:
+                fcntl.flock(self._fd, fcntl.LOCK_SH)
+
+            self._readers += 1
+            self._batch += 1
+
+        try:
+            yield
+
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if self._readers == 0:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+                    self._batch = 0
+                    self._condition.notify_all()
+
+    def _offset(self, index: int) -> int:
+        return self._HEADER_SIZE + index * self.slot_size
+
+    def _probe(self, key: bytes):
+        start = int.from_bytes(key[:8], 'little') % self.slots
+        for step in range(self.max_probes):
+            index = (start + step) % self.slots
+            yield index, self._SLOT.unpack_from(self._map, self._offset(index))
+
+    def _find(self, key: bytes, kind: int) -> Optional[int]:
+        for index, (slot_key, expires, slot_kind, _) in self._probe(key):
+            if slot_kind == self._EMPTY:
+                return None
+
+            if slot_key == key and slot_kind == kind and expires > time.time():
+                return index
+
+        return None
+
+    def _write(self, key: bytes, kind: int, expires: float, value: bytes = b''):
+        now = time.time()
+        free = None
+        victim = None
+        for index, (slot_key, slot_expires, slot_kind, _) in self._probe(key):
+            if slot_key == key and slot_kind in (self._CACHED, self._REVOKED):
+                if slot_kind == self._REVOKED and kind == self._CACHED and slot_expires > now:
+                    return
+
+                free = index
+                break
+
+            if slot_kind == self._EMPTY:
+                free = index if free is None else free
+                break
+
+            if free is None and (slot_kind == self._DELETED or slot_expires <= now):
+                free = index
+
+            elif slot_kind == self._CACHED and (victim is None or slot_expires < victim[1]):
+                victim = (index, slot_expires)
+
+        if free is None and victim is not None:
+            free = victim[0]
+
+        if free is None:
+            if kind == self._CACHED:
+                return
+
+            raise SharedStateFull(f'There is no free slot in {self.path} for the revoked token')
+
+        offset = self._offset(free)
+        self._SLOT.pack_into(self._map, offset, key, expires, kind, len(value))
+        self._map[offset + self._SLOT.size:offset + self._SLOT.size + len(value)] = value
+
+    def _remove(self, key: bytes, kind: int):
+        index = self._find(key, kind)
+        if index is not None:
+            self._SLOT.pack_into(self._map, self._offset(index), key, 0.0, self._DELETED, 0)
+
+    def _read(self, index: int) -> bytes:
+        offset = self._offset(index)
+        length = self._SLOT.unpack_from(self._map, offset)[3]
+        return self._map[offset + self._SLOT.size:offset + self._SLOT.size + length]
+
+    def get(self, token: str) -> Optional[dict]:
+        key = token_key(token)
+        with self._shared():
+            index = self._find(key, self._CACHED)
+            if index is None:
+                return None
+
+            value = self._read(index)
+
+        return json.loads(value)
+
+    def lookup(self, token: str) -> Tuple[bool, Optional[dict]]:
+        key = token_key(token)
+        with self._shared():
+            if self._find(key, self._REVOKED) is not None:
+                return True, None
+
+            index = self._find(key, self._CACHED)
+            if index is None:
+                return False, None
+
+            value = self._read(index)
+
+        return False, json.loads(value)
+
+    def set(self, token: str, payload: dict, ttl: float):
+        value = json.dumps(payload, separators = (',', ':')).encode()
+        if ttl <= 0 or len(value) > self.slot_size - self._SLOT.size:
+            return
+
+        with self._locked():
+            self._write(token_key(token), self._CACHED, time.time() + ttl, value)
+
+    def delete(self, token: str):
+        with self._locked():
+            self._remove(token_key(token), self._CACHED)
+
+    def revoke(self, token: str, ttl: float):
+        key = token_key(token)
+        with self._locked():
+            self._remove(key, self._CACHED)
+            self._write(key, self._REVOKED, time.time() + ttl)
+
+    def is_revoked(self, token: str) -> bool:
+        with self._shared():
+            return self._find(token_key(token), self._REVOKED) is not None
+
+    def clear(self):
+        with self._locked():
+            self._map[self._HEADER_SIZE:] = bytes(self.slots * self.slot_size)
+
+    def close(self):
+        """Closes the file. The state stays in the file for the other workers"""
+
+        self._map.close()
+        os.close(self._fd)
@@ -18,7 +18,8 @@ setup(
   packages=find_packages(),
   install_requires=[
       'fastapi',
-      'fastapi-jwt',
+      'fastapi-jwt<0.3',
+      'python-jose',
       'pydantic',
       'itsdangerous',
       'sqlalchemy'
@@ -0,0 +1,50 @@
+import threading
+import time
+
+import pytest
+
+from fastapi_easyauth.sharedstate import SharedMemoryStateBackend
+
+
+@pytest.fixture
+def state(tmp_path):
+    state = SharedMemoryStateBackend(str(tmp_path / 'state'), slots = 1024, slot_size = 256)
+    yield state
+    state.close()
+
+
+@pytest.mark.parametrize('readers', [8, 16])
+def test_writers_are_not_starved_by_readers(state, readers):
+    state.set('cached', {'subject': 'user'}, 60)
+    stop = threading.Event()
+    errors = []
+
+    def read():
+        try:
+            while not stop.is_set():
+                state.lookup('cached')
+
+        except Exception as e:  # pragma: no cover
+            errors.append(e)
+
+    threads = [threading.Thread(target = read, daemon = True) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        time.sleep(0.1)
+        for number in range(20):
+            started = time.perf_counter()
+            state.set(f'token-{number}', {'number': number}, 60)
+            state.revoke(f'revoked-{number}', 60)
+            assert time.perf_counter() - started < 1.0
+
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join(5)
+
+    assert not errors
+    assert state.lookup('revoked-19') == (True, None)
+    assert state.lookup('token-19') == (False, {'number': 19})
+    assert state.lookup('cached') == (False, {'subject': 'user'})